@@ -8,6 +8,7 @@ Email:   mark.fruman@yahoo.com
 """
 import pandas as pd
 import geopandas as gpd
+from concurrent.futures import ThreadPoolExecutor
 from .constants import areas
 from .utils import validate_ridings, apply_riding_map
 from . import votes, geometry, viz
@@ -176,15 +177,23 @@ class CanadaVotes:
         """
         load and merge all data for ridings specified
         """
-        for year in self.years:
-            print(f"Loading year {year} . . . ", end="")
+        def load_year(year):
             new_ridings = validate_ridings(
                 list(self.ridings.difference(self.loaded[year])),
                 year=year
             )
             if len(list(new_ridings)) > 0:
                 self._load_all(year, new_ridings, robust=robust)
-            print("loaded.")
+            return year
+
+        # the years are independent (and each only updates its own tables),
+        # so load them concurrently; most of the work is file I/O, parsing
+        # and GEOS unions, which release the GIL
+        print(f"Loading years {', '.join(map(str, self.years))} . . .")
+        n_workers = max(1, len(self.years))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for year in executor.map(load_year, self.years):
+                print(f"year {year} loaded.")
 
         return self
 
@@ -310,8 +319,8 @@ class CanadaVotes:
                             "ElectedIndicator", "Votes", "TotalVotes"])
                       .copy())
                 df["Estring"] = (df["ElectedIndicator"]
-                                 .map(lambda val: ("  (Elected)"
-                                                   if val == "Y" else "")))
+                                 .eq("Y")
+                                 .map({True: "  (Elected)", False: ""}))
                 df["Candidate"] = (df["CandidateLastName"]
                                    + ", " + df["CandidateFirstName"]
                                    + df["Estring"])
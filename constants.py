@@ -15,15 +15,56 @@ outputdir = os.path.join(basedir, "output")
 
 geometry_files = {
     2008: {"filename": "pd308.2008.zip",
-           "layer": "pd308_a"},
+           "layer": "pd308_a",
+           "url": ("https://ftp.geogratis.gc.ca/pub/nrcan_rncan/"
+                   + "vector/electoral/2008/pd308.2008.zip"),
+           "pdf_url": None},
     2011: {"filename": "pd308.2011.zip",
-           "layer": "pd_a"},
+           "layer": "pd_a",
+           "url": ("https://ftp.geogratis.gc.ca/pub/nrcan_rncan/"
+                   + "vector/electoral/2011/pd308.2011.zip"),
+           "pdf_url": None},
     2015: {"filename": "polling_divisions_boundaries_2015_shp.zip",
-           "layer": None},
+           "layer": None,
+           "url": ("https://ftp.maps.canada.ca/pub/elections_elections/"
+                   + "Electoral-districts_Circonscription-electorale/"
+                   + "polling_divisions_boundaries_2015/"
+                   + "polling_divisions_boundaries_2015_shp.zip"),
+           "pdf_url": ("https://ftp.maps.canada.ca/pub/elections_elections/"
+                       + "Electoral-districts_Circonscription-electorale/"
+                       + "polling_divisions_boundaries_2015/"
+                       + "doc/Data_Dictionary.pdf")},
     2019: {"filename": "polling_divisions_boundaries_2019.shp.zip",
-           "layer": None},
+           "layer": None,
+           "url": ("https://ftp.maps.canada.ca/pub/elections_elections/"
+                   + "Electoral-districts_Circonscription-electorale/"
+                   + "Elections_Canada_2019/"
+                   + "polling_divisions_boundaries_2019.shp.zip"),
+           "pdf_url": ("https://ftp.maps.canada.ca/pub/elections_elections/"
+                       + "Electoral-districts_Circonscription-electorale/"
+                       + "Elections_Canada_2019/"
+                       + "Elections_Canada_2019_Data_Dictionary.pdf")},
     2021: {"filename": "PD_CA_2021_EN.zip",
-           "layer": None}
+           "layer": None,
+           "url": ("https://ftp.maps.canada.ca/pub/elections_elections/"
+                   + "Electoral-districts_Circonscription-electorale/"
+                   + "Elections_Canada_2021/PD_CA_2021_EN.zip"),
+           "pdf_url": ("https://ftp.maps.canada.ca/pub/elections_elections/"
+                       + "Electoral-districts_Circonscription-electorale/"
+                       + "Elections_Canada_2021/"
+                       + "Elections_Canada_2021_Data_Dictionary.pdf")}
+}
+
+# base addresses of the poll-by-poll vote results on elections.ca
+votes_urls = {
+    2008: "https://www.elections.ca/scripts/OVR2008/31/data/",
+    2011: "https://www.elections.ca/scripts/OVR2011/34/data_donnees/",
+    2015: ("https://www.elections.ca/"
+           + "res/rep/off/ovr2015app/41/data_donnees/"),
+    2019: ("https://www.elections.ca/"
+           + "res/rep/off/ovr2019app/51/data_donnees/"),
+    2021: ("https://www.elections.ca/"
+           + "res/rep/off/ovr2021app/53/data_donnees/")
 }
 
 votes_encodings = {
@@ -7,17 +7,60 @@ Email:   mark.fruman@yahoo.com
 -------------------------------------------------------
 """
 import os
-import shutil
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from math import cos, pi
-from zipfile import ZipFile
+import shapely
+from math import cos, isqrt
+from functools import lru_cache
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pyproj import Transformer
 from shapely.errors import GEOSException
 from shapely import MultiPolygon, unary_union, coverage_union_all, simplify
 from .votes import compute_vote_fraction
 from .constants import codeprovs, datadir, areas, geometry_files, provcodes
 from .utils import (provs_from_ridings, validate_ridings, apply_riding_map,
-                    get_inv_riding_map, get_int_part)
+                    get_inv_riding_map)
+
+# build the coordinate transformations used for centroid computation once
+# (constructing a PROJ pipeline is expensive compared to applying it);
+# EPSG:3347 (NAD83 / Statistics Canada Lambert) is a Lambert conformal
+# conic projection designed for all of Canada: not equal-area, but with
+# little distortion across a riding, so planar centroids computed in it
+# are close to the true ones
+_T_4326_3347 = Transformer.from_crs(4326, 3347, always_xy=True)
+_T_3347_4326 = Transformer.from_crs(3347, 4326, always_xy=True)
+
+# riding names with centroid coordinates (radians), as kept in memory
+_RidingCentroids = namedtuple("RidingCentroids", ["names", "lons", "lats"])
+
+# one bounded thread pool shared by all robust_dissolve() calls (which may
+# themselves run in several threads, e.g. one per election year), rather
+# than a full-width pool per call
+_dissolve_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+
+
+def _project_geoms(geoms, transformer):
+    """
+    Apply a coordinate transformation directly to an array of geometries
+
+    Parameters
+    ----------
+    geoms : array-like
+        shapely geometries
+    transformer : pyproj.Transformer
+        transformation to apply (with always_xy=True)
+
+    Returns
+    -------
+    np.ndarray
+        transformed geometries
+    """
+    geoms = np.array(geoms, dtype=object)
+    coords = shapely.get_coordinates(geoms)
+    x, y = transformer.transform(coords[:, 0], coords[:, 1])
+    return shapely.set_coordinates(geoms, np.c_[x, y])
 
 
 def load_geometries(ridings=None, area=None, year=2021, advance=False):
@@ -55,26 +98,64 @@ def load_geometries(ridings=None, area=None, year=2021, advance=False):
     # get list of province codes from riding numbers
     provcode_list = provs_from_ridings(year=year, ridings=ridings)
 
-    gdf = gpd.GeoDataFrame()
+    def read_province(provcode):
+        """
+        read geometry file for a single province and select the ridings
+
+        Parameters
+        ----------
+        provcode : int
+            numeric province code
 
-    for provcode in provcode_list:
+        Returns
+        -------
+        gpd.GeoDataFrame
+        """
         province = codeprovs[provcode]
 
         if advance:
-            geometry_file = f"{year}_{province}_{provcode}_geometries_adv.zip"
+            geometry_file = f"{year}_{province}_{provcode}_geometries_adv"
         else:
-            geometry_file = f"{year}_{province}_{provcode}_geometries.zip"
+            geometry_file = f"{year}_{province}_{provcode}_geometries"
+        geometry_path = os.path.join(datadir, geometry_file)
 
-        gdf0 = gpd.read_file(os.path.join(datadir, geometry_file),
-                             encoding="latin1")
-        gdf = pd.concat((gdf, gdf0), ignore_index=True)
+        prov_riding_codes = [rid for rid in riding_codes
+                             if rid // 1000 == provcode]
 
-    gdf = gdf[gdf["FED_NUM"].isin(riding_codes)]
-
-    # change poll number and advance poll number to integer type
-    if "PD_NUM" in gdf.columns:
-        gdf["PD_NUM"] = gdf["PD_NUM"].astype("int64")
-    gdf["ADV_POLL_N"] = gdf["ADV_POLL_N"].astype("int64")
+        # only the riding and poll numbers are used downstream, so skip
+        # parsing the other attribute columns
+        if advance:
+            columns = ["FED_NUM", "ADV_POLL_N"]
+        else:
+            columns = ["FED_NUM", "PD_NUM", "ADV_POLL_N"]
+
+        # prefer the GeoParquet copy of the file if there is one
+        # (selecting ridings via the row-group statistics)
+        if os.path.exists(f"{geometry_path}.parquet"):
+            return gpd.read_parquet(f"{geometry_path}.parquet",
+                                    columns=columns + ["geometry"],
+                                    filters=[("FED_NUM", "in",
+                                              prov_riding_codes)])
+
+        # have GDAL select the requested ridings while reading the file
+        # rather than building geometries for the whole province
+        where = f"FED_NUM IN ({','.join(map(str, prov_riding_codes))})"
+
+        return gpd.read_file(f"{geometry_path}.zip", engine="pyogrio",
+                             encoding="latin1", columns=columns,
+                             where=where)
+
+    # read the provincial files concurrently (the work is file I/O and
+    # parsing in GDAL, which releases the GIL)
+    n_workers = max(1, min(8, len(provcode_list)))
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        gdf = pd.concat(executor.map(read_province, provcode_list),
+                        ignore_index=True)
+
+    # change riding, poll and advance poll numbers to (compact) integer type
+    for col in ["FED_NUM", "PD_NUM", "ADV_POLL_N"]:
+        if col in gdf.columns:
+            gdf[col] = gdf[col].astype("int32")
 
     return gdf
 
@@ -101,12 +182,12 @@ def dissolve_ridings(gdf, robust=True):
     else:
         gdf = gdf.dissolve(by="FED_NUM", method="coverage")
 
-    # switch coordinate system to extract centroid, then switch back
-    gdf = gdf.to_crs(epsg=2263)
-    gdf["centroid"] = gdf.centroid
-    # switch back to longitude/latitude
-    gdf = gdf.to_crs(epsg=4326)
-    gdf["centroid"] = gdf["centroid"].to_crs(epsg=4326)
+    # project to planar coordinates to extract centroids, then transform
+    # only the centroids back to longitude/latitude
+    geoms = _project_geoms(gdf.geometry.values, _T_4326_3347)
+    centroids = _project_geoms(shapely.centroid(geoms), _T_3347_4326)
+    gdf["centroid"] = gpd.GeoSeries(centroids, index=gdf.index,
+                                    crs="epsg:4326")
 
     return gdf
 
@@ -168,37 +249,47 @@ def combine_mergedwith_columns(gdf, robust=False):
     -------
     gpd.GeoDataFrame
     """
-    # since we're writing new columns, don't touch passed-in DataFrame
-    gdf = gdf.copy()
-
     # plan is to dissolve polling stations
     # grouped by common vote-counting merges
 
     # if a poll is not merged with another,
     # then it is "merged" with itself
-    gdf["MergedWith"] = [row["Poll"].strip()
-                         if pd.isna(row["MergedWith"])
-                         else row["MergedWith"]
-                         for _, row in gdf.iterrows()]
+    # (assign() returns a new frame, so the passed-in DataFrame is not
+    # touched, without a deep copy of all the geometries up front)
+    # (district and party names are made categorical, so the groupbys
+    # below hash small integer codes rather than strings)
+    gdf = gdf.assign(MergedWith=gdf["MergedWith"]
+                     .where(gdf["MergedWith"].notna(),
+                            gdf["Poll"].str.strip()),
+                     DistrictName=gdf["DistrictName"].astype("category"),
+                     Party=gdf["Party"].astype("category"))
 
     # this is to handle a bug in some riding vote files where the
     # rows for the different parties at the same poll
     # have different "MergedWith" values (some NaN, some non-NaN)
     # the code below will set the MergedWith value to the majority
-    # value within each poll
-    def grpfun(grp):
-        grp = grp.copy()
-        grpmode = grp["MergedWith"].mode()
-        if len(grpmode) > 0:
-            grp["MergedWith"] = grpmode.iloc[0]
-        return grp
-    gdf = (gdf
-           .groupby(["DistrictName", "PD_NUM"], as_index=False)[gdf.columns]
-           .apply(grpfun))
+    # value within each poll (ties going to the smallest value, as with
+    # Series.mode())
+    mw_mode = (gdf
+               .groupby(["DistrictName", "PD_NUM", "MergedWith"],
+                        observed=True)
+               .size()
+               .rename("count")
+               .reset_index()
+               .sort_values(["count", "MergedWith"], ascending=[False, True])
+               .drop_duplicates(["DistrictName", "PD_NUM"])
+               .set_index(["DistrictName", "PD_NUM"])
+               ["MergedWith"]
+               .rename("MergedWithMode"))
+    gdf["MergedWith"] = (gdf
+                         .join(mw_mode, on=["DistrictName", "PD_NUM"])
+                         ["MergedWithMode"])
 
     # reassign "PD_NUM" to numeric part of "MergedWith" column
     # (old PD_NUM disappears on dissolve below anyway)
-    gdf["PD_NUM"] = gdf["MergedWith"].map(get_int_part)
+    gdf["PD_NUM"] = (gdf["MergedWith"]
+                     .str.extract(r"^\s*(\d+)", expand=False)
+                     .astype("int32"))
 
     # create geometry for groups of merged polls
     # the number of votes should only be non-zero for the target
@@ -211,17 +302,49 @@ def combine_mergedwith_columns(gdf, robust=False):
                                        "TotalVotes": "max"})
     else:
         gdf = gdf.dissolve(by=["DistrictName", "Party", "PD_NUM"],
-                           method="coverage",
+                           method="coverage", observed=True,
                            aggfunc={"Electors": "sum",
                                     "Votes": "max",
                                     "TotalVotes": "max"})
 
+    # turn the district and party index levels back into plain strings
+    gdf.index = gdf.index.set_levels(
+        [gdf.index.levels[0].astype(str), gdf.index.levels[1].astype(str)],
+        level=[0, 1])
+
     # (re)compute vote fraction with aggregated columns
     gdf = compute_vote_fraction(gdf)
 
     return gdf
 
 
+def _cascaded_union(geoms, chunk=None):
+    """
+    Union of geometries computed chunk by chunk followed by a union of the
+    partial results (much faster than one unary_union for large groups)
+
+    Parameters
+    ----------
+    geoms : array-like
+        shapely geometries
+    chunk : int
+        number of geometries per chunk (default: square root of the number
+        of geometries, but at least 32)
+
+    Returns
+    -------
+    shapely.Geometry
+    """
+    geoms = np.asarray(geoms)
+    n = len(geoms)
+    if n < 64:
+        return unary_union(geoms)
+    if chunk is None:
+        chunk = max(32, isqrt(n))
+    return unary_union([unary_union(geoms[i:i + chunk])
+                        for i in range(0, n, chunk)])
+
+
 def robust_dissolve(gdf, by=None, aggfunc=None, verbose=False):
     """
     Robust (hopefully) alternative to GeoDataFrame.dissolve() for
@@ -250,15 +373,21 @@ def robust_dissolve(gdf, by=None, aggfunc=None, verbose=False):
 
         Parameters
         ----------
-        col : gpd.GeoSeries
+        col : np.ndarray
+            shapely geometries in the group
 
         Returns
         -------
-        gpd.GeoSeries
+        shapely.Geometry
         """
         try:
-            # try coverage dissolve (fastest if it works)
-            return coverage_union_all(col)
+            # try coverage dissolve (fastest if it works; polygons that
+            # overlap or leave gaps give an invalid result rather than an
+            # error, so check it)
+            union = coverage_union_all(col)
+            if not union.is_valid:
+                raise GEOSException("coverage union result is invalid")
+            return union
         except GEOSException as ge:
             try:
                 if verbose:
@@ -266,7 +395,7 @@ def robust_dissolve(gdf, by=None, aggfunc=None, verbose=False):
                           + " trying unary dissolve"
                           + f"\n{ge}")
                 # try unary dissolve (might also fail)
-                return unary_union(col)
+                return _cascaded_union(col)
             except GEOSException as ge2:
                 # try building a multipolygon
                 try:
@@ -275,12 +404,14 @@ def robust_dissolve(gdf, by=None, aggfunc=None, verbose=False):
                               + " trying manually building MultiPolygon"
                               + f"\n{ge2}")
                     # handle simple and nonsimple geometries separately
-                    simps = unary_union(col[col.is_simple])
+                    # (evaluating the is_simple predicate only once)
+                    simple_mask = shapely.is_simple(col)
+                    simps = unary_union(col[simple_mask])
                     if isinstance(simps, MultiPolygon):
                         simps = list(simps.geoms)
                     else:
                         simps = [simps]
-                    nonsimps = col[~col.is_simple].tolist()
+                    nonsimps = col[~simple_mask].tolist()
                     # if isinstance(nonsimps, MultiPolygon):
                     #     nonsimps = list(nonsimps.geoms)
                     # else:
@@ -295,7 +426,7 @@ def robust_dissolve(gdf, by=None, aggfunc=None, verbose=False):
                     # try simplifying polygons and dissolving again
                     col = simplify(col, tolerance=0.001)
                     try:
-                        return unary_union(col)
+                        return _cascaded_union(col)
                     except GEOSException as ge4:
                         # try other method
                         print(f"Warning: unary dissolve failed again,"
@@ -303,13 +434,35 @@ def robust_dissolve(gdf, by=None, aggfunc=None, verbose=False):
                               + f"\n{ge4}")
                         return coverage_union_all(col)
 
-    # add colfun to the aggfunc dict passed in
-    if aggfunc is None:
-        aggfunc = {}
-    aggfunc["geometry"] = colfun
-    gdf = gdf.groupby(by=by).agg(aggfunc)
+    # aggregate the non-geometry columns in one vectorized pass
+    aggfunc = {col: func for col, func in (aggfunc or {}).items()
+               if col != "geometry"}
+    grouped = gdf.groupby(by=by, observed=True)
+    if aggfunc:
+        df_agg = grouped.agg(aggfunc)
+    else:
+        df_agg = pd.DataFrame(index=grouped.size().index)
+
+    # take the groups from the raw array of shapely geometries (skipping
+    # the GeoSeries indexing and wrapping); a lone geometry (e.g. a poll
+    # not merged with any other) is already its own union, so only groups
+    # of several geometries are merged, in the shared thread pool (GEOS
+    # releases the GIL, so the groups are dissolved in parallel)
+    geometry = np.asarray(gdf.geometry.values)
+    indices = grouped.indices
+    groups = [geometry[indices[key]] for key in df_agg.index]
+    unions = [col[0] if len(col) == 1 else None for col in groups]
+    multiple = [i for i, col in enumerate(groups) if len(col) > 1]
+    for i, union in zip(multiple,
+                        _dissolve_pool.map(colfun,
+                                           [groups[i] for i in multiple])):
+        unions[i] = union
+    df_agg["geometry"] = unions
+
     # make sure new "geometry" column is the geometry column of record
-    gdf = gdf.set_geometry("geometry", crs="epsg:4326")
+    # (keeping the coordinate system of the input, if it has one)
+    crs = getattr(gdf, "crs", None) or "epsg:4326"
+    gdf = gpd.GeoDataFrame(df_agg, geometry="geometry", crs=crs)
     return gdf
 
 
@@ -335,7 +488,7 @@ def generate_provincial_geometries(year=2021):
         return
 
     # load GeoDataFrame
-    gdf = gpd.read_file(os.path.join(datadir, eday_file),
+    gdf = gpd.read_file(os.path.join(datadir, eday_file), engine="pyogrio",
                         layer=layer, encoding="latin1")
 
     # for some reason, in 2019 columns were "FEDNUM" etc. but in 2015
@@ -350,6 +503,10 @@ def generate_provincial_geometries(year=2021):
     if "ADVPOLL" in gdf.columns:
         gdf = gdf.rename(columns={"ADVPOLL": "ADV_POLL_N"})
 
+    # the first two digits of the (five-digit) riding number are the
+    # province code: find the rows of each province in one integer pass
+    prov_rows = gdf.groupby(gdf["FED_NUM"].astype(int) // 1000).indices
+
     for prov, provcode in provcodes.items():
         # iterate over provinces, generate subset dataframe
         # and write it to zip file
@@ -360,36 +517,41 @@ def generate_provincial_geometries(year=2021):
             continue
 
         # restrict national file to this province and convert to lon/lat
-        gdf_prov = (gdf[gdf["FED_NUM"]
-                    .astype(str).str.startswith(f"{provcode}")])
+        gdf_prov = gdf.iloc[prov_rows.get(provcode, [])]
 
         # for recent elections, separate Advance Poll geometries file
         # published, but we can "dissolve" it from the election-day
-        # file anyway:
-        gdf_prov_adv = (gdf_prov
-                        .sort_values(["FED_NUM", "ADV_POLL_N"])
-                        .dissolve(by=["FED_NUM", "ADV_POLL_N"])
+        # file anyway (robust_dissolve tries the fast coverage union
+        # first, but falls back if the poll divisions overlap or leave
+        # gaps):
+        gdf_prov_adv = (robust_dissolve(gdf_prov
+                                        .sort_values(["FED_NUM",
+                                                      "ADV_POLL_N"]),
+                                        by=["FED_NUM", "ADV_POLL_N"])
                         .reset_index()
                         .get(["FED_NUM", "ADV_POLL_N", "geometry"]))
 
         # write both election-day and advance-poll shape files to disk:
         for gdf_p, filename in [(gdf_prov, eday_filename),
                                 (gdf_prov_adv, adv_filename)]:
-            # make folder for shape files
-            os.mkdir(os.path.join(datadir, filename))
-            # convert to longitude / latitude coordinates
-            # and write to disk
-            (gdf_p
-             .to_crs(epsg=4326)
-             .to_file(os.path.join(datadir, filename, f"{filename}.shp")))
-
-            # add folder to zip file and delete
-            with ZipFile(os.path.join(datadir, f"{filename}.zip"),
-                         "w") as zf:
-                for f in os.listdir(os.path.join(datadir, filename)):
-                    zf.write(os.path.join(datadir, filename, f),
-                             arcname=f)
-            shutil.rmtree(os.path.join(datadir, filename))
+            # convert to longitude / latitude coordinates and sort by
+            # riding (so parquet row groups cover narrow FED_NUM ranges),
+            # keeping the original order of the polls within each riding
+            gdf_p = (gdf_p.to_crs(epsg=4326)
+                     .sort_values("FED_NUM", kind="stable"))
+
+            # write straight to a zipped shapefile (GDAL writes "*.shp.zip"
+            # natively), then rename it to the name load_geometries expects
+            gdf_p.to_file(os.path.join(datadir, f"{filename}.shp.zip"),
+                          driver="ESRI Shapefile", engine="pyogrio",
+                          use_arrow=True)
+            os.replace(os.path.join(datadir, f"{filename}.shp.zip"),
+                       os.path.join(datadir, f"{filename}.zip"))
+
+            # also write a GeoParquet copy, which load_geometries reads
+            # much faster (and filters by riding without parsing the rest)
+            gdf_p.to_parquet(os.path.join(datadir, f"{filename}.parquet"),
+                             index=False, row_group_size=50000)
 
 
 def compute_riding_centroids(year):
@@ -410,58 +572,151 @@ def compute_riding_centroids(year):
         return
 
     # load GeoDataFrame
-    gdf = gpd.read_file(os.path.join(datadir, filename),
+    gdf = gpd.read_file(os.path.join(datadir, filename), engine="pyogrio",
                         layer=layer, encoding="latin1")
 
     # 2019 file has column "FEDNUM" instead of "FED_NUM"
     if "FEDNUM" in gdf.columns:
         gdf = gdf.rename(columns={"FEDNUM": "FED_NUM"})
 
-    # dissolve ridings
-    gdf = gdf.dissolve(by="FED_NUM")
-
-    # switch coordinate system to extract centroid, then switch back
-    gdf = gdf.to_crs(epsg=2263)
-    gdf["centroid"] = gdf.centroid
-    # switch back to longitude/latitude
-    gdf = gdf.to_crs(epsg=4326)
-    gdf["centroid"] = gdf["centroid"].to_crs(epsg=4326)
-
-    gdf["centroid_lon"] = gdf["centroid"].x
-    gdf["centroid_lat"] = gdf["centroid"].y
+    # dissolve ridings (coverage union where the poll divisions form a
+    # clean coverage of the riding, falling back otherwise)
+    gdf = robust_dissolve(gdf, by="FED_NUM")
+
+    # project the geometries to extract centroids (directly on the shapely
+    # array), then transform the centroid coordinates back to lon/lat
+    # (centroids were once computed in EPSG:2263, a New York state plane,
+    # so a centroids file written before the switch to the Canada-wide
+    # conformal EPSG:3347 differs from a freshly computed one, by more for
+    # larger ridings; delete it to recompute)
+    geoms = np.asarray(gdf.geometry.to_crs(epsg=3347).values)
+    centroids = shapely.centroid(geoms)
+    (gdf["centroid_lon"],
+     gdf["centroid_lat"]) = _T_3347_4326.transform(shapely.get_x(centroids),
+                                                   shapely.get_y(centroids))
 
     inv_riding_map = get_inv_riding_map(year)
     gdf["DistrictName"] = gdf.index.map(inv_riding_map)
 
     # write to CSV file
-    (gdf
-     .reset_index()
-     .get(["FED_NUM", "DistrictName", "centroid_lon", "centroid_lat"])
-     .to_csv(os.path.join(datadir, f"{year}_riding_centroids.csv"),
-             index=None))
+    df_centroids = (gdf
+                    .reset_index()
+                    .get(["FED_NUM", "DistrictName",
+                          "centroid_lon", "centroid_lat"]))
+    df_centroids.to_csv(os.path.join(datadir, f"{year}_riding_centroids.csv"),
+                        index=None)
+
+    # also store names and coordinates (already converted to radians) as
+    # plain arrays (no parsing or conversion needed to load them in
+    # get_nearest_ridings)
+    np.savez(os.path.join(datadir, f"{year}_riding_centroids.npz"),
+             names=df_centroids["DistrictName"].to_numpy(dtype=str),
+             lons_rad=np.deg2rad(df_centroids["centroid_lon"]
+                                 .to_numpy(dtype="float64")),
+             lats_rad=np.deg2rad(df_centroids["centroid_lat"]
+                                 .to_numpy(dtype="float64")))
+
+    # discard any centroids loaded from a previous version of the file
+    _load_centroids.cache_clear()
 
 
 def haversine(p1, p2):
     """
-    Compute haversine distance argument between two points
+    Compute haversine distance argument between two points (or between
+    arrays of points, broadcasting as in numpy)
 
     Parameters
     ----------
-    p1 : (float, float)
-        first point in (longitude, latitude) degrees
-    p2 : (float, float)
-        second point
+    p1 : (float, float) or (np.ndarray, np.ndarray)
+        first point(s) in (longitude, latitude) degrees
+    p2 : (float, float) or (np.ndarray, np.ndarray)
+        second point(s)
 
     Returns
     -------
-    float
+    float or np.ndarray
         2 * ( sin( d / (2 R) ) ) ^2
     """
-    p1 = pi / 180. * p1[0], pi / 180. * p1[1]
-    p2 = pi / 180. * p2[0], pi / 180. * p2[1]
-    dlat = p2[1] - p1[1]
-    dlon = p2[0] - p1[0]
-    return 1.0 - cos(dlat) + cos(p1[1]) * cos(p2[1]) * (1.0 - cos(dlon))
+    lon1, lat1 = np.deg2rad(p1[0]), np.deg2rad(p1[1])
+    lon2, lat2 = np.deg2rad(p2[0]), np.deg2rad(p2[1])
+    return (1.0 - np.cos(lat2 - lat1)
+            + np.cos(lat1) * np.cos(lat2) * (1.0 - np.cos(lon2 - lon1)))
+
+
+@lru_cache(maxsize=4)
+def _load_centroids(year):
+    """
+    Load riding names and centroids from the cached arrays (or CSV file
+    if the arrays have not been written); the results are kept in memory
+    for subsequent calls
+
+    Parameters
+    ----------
+    year : int
+        election year
+
+    Returns
+    -------
+    RidingCentroids
+        riding names, centroid longitudes and centroid latitudes (radians)
+        as numpy arrays
+    """
+    npzfile = os.path.join(datadir, f"{year}_riding_centroids.npz")
+    if os.path.exists(npzfile):
+        with np.load(npzfile) as npz:
+            return _RidingCentroids(npz["names"], npz["lons_rad"],
+                                    npz["lats_rad"])
+
+    df_centroids = pd.read_csv(
+        os.path.join(datadir, f"{year}_riding_centroids.csv"),
+        encoding="utf-8")
+    return _RidingCentroids(
+        df_centroids["DistrictName"].to_numpy(),
+        np.deg2rad(df_centroids["centroid_lon"].to_numpy(dtype="float64")),
+        np.deg2rad(df_centroids["centroid_lat"].to_numpy(dtype="float64")))
+
+
+def _nearest_indices(lons, lats, lon0, lat0, n):
+    """
+    Find the n points nearest to a reference point by haversine distance
+
+    Parameters
+    ----------
+    lons : np.ndarray
+        longitudes of points (radians)
+    lats : np.ndarray
+        latitudes of points (radians)
+    lon0 : float
+        longitude of reference point (radians)
+    lat0 : float
+        latitude of reference point (radians)
+    n : int
+        number of points to return
+
+    Returns
+    -------
+    np.ndarray
+        indices of the n nearest points, nearest first
+    """
+    # evaluate 1 - cos(dlat) + cos(lat0) cos(lat) (1 - cos(dlon)) in place
+    # in two work arrays instead of allocating a temporary per operation
+    dists = np.subtract(lons, lon0)
+    np.cos(dists, out=dists)
+    np.subtract(1.0, dists, out=dists)
+    work = np.cos(lats)
+    np.multiply(dists, work, out=dists)
+    np.multiply(dists, cos(lat0), out=dists)
+    np.subtract(lats, lat0, out=work)
+    np.cos(work, out=work)
+    np.subtract(dists, work, out=dists)
+    np.add(dists, 1.0, out=dists)
+
+    # select the n nearest without sorting all of them, then order those
+    if n < len(dists):
+        idx = np.argpartition(dists, n)[:n]
+    else:
+        idx = np.arange(len(dists))
+    return idx[np.argsort(dists[idx])]
 
 
 def get_nearest_ridings(riding, n=10, year=2021):
@@ -487,23 +742,13 @@ def get_nearest_ridings(riding, n=10, year=2021):
         print("computing and caching riding centroids . . .")
         compute_riding_centroids(year)
 
-    df_centroids = pd.read_csv(os.path.join(datadir,
-                                            f"{year}_riding_centroids.csv"),
-                               encoding="utf-8")
+    centroids = _load_centroids(year)
 
-    if (df_centroids["DistrictName"] == riding).sum() == 0:
+    matches = np.flatnonzero(centroids.names == riding)
+    if len(matches) == 0:
         return []
+    i = matches[0]
 
-    p1 = (df_centroids
-          .loc[df_centroids["DistrictName"] == riding]
-          .get(["centroid_lon", "centroid_lat"])
-          .iloc[0]
-          .values)
-
-    dists = (df_centroids
-             .apply(lambda row: haversine(p1,
-                                          row[["centroid_lon",
-                                               "centroid_lat"]].values),
-                    axis=1)
-             .sort_values())
-    return df_centroids.loc[dists.index[:n], "DistrictName"].tolist()
+    idx = _nearest_indices(centroids.lons, centroids.lats,
+                           centroids.lons[i], centroids.lats[i], n)
+    return centroids.names[idx].tolist()
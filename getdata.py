@@ -8,13 +8,54 @@ Email:   mark.fruman@yahoo.com
 """
 import os
 import requests
+from zipfile import is_zipfile
+from threading import Lock
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urljoin
-from .constants import datadir, datasetdir, provcodes, datasets
-from .utils import update_riding_map_file
+from concurrent.futures import ThreadPoolExecutor
+from .constants import (datadir, datasetdir, provcodes, datasets,
+                        geometry_files, votes_urls)
+from .utils import update_riding_map_file, load_json, write_json
+
+# shared HTTP session (keeps connections to the same host alive across
+# downloads), with a connection pool large enough for the parallel
+# downloads and retries of transient failures
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                                      max_retries=Retry(total=3,
+                                                        backoff_factor=0.5)))
+
+# (connect, read) timeouts in seconds for download requests
+timeout = (5, 60)
+
+# the riding map file is read, updated and rewritten by each province's
+# download, so concurrent downloads must take turns updating it
+_riding_map_lock = Lock()
+
+
+@lru_cache(maxsize=None)
+def _ensure_dir(path):
+    """
+    Create a directory if it doesn't exist (once per session)
+
+    Parameters
+    ----------
+    path : str
+        directory to create
+
+    Returns
+    -------
+    str
+        path of the directory
+    """
+    os.makedirs(path, exist_ok=True)
+    return path
 
 
 def download_file(fileurl, filename=None, prefix="",
-                  location="data", overwrite=False):
+                  location="data", overwrite=False, session=session):
     """
     Download a file in chunks
 
@@ -29,7 +70,10 @@ def download_file(fileurl, filename=None, prefix="",
     location : str
         either "datadir" or "datasets"
     overwrite : bool
-        if False (default), do not overwrite existing file
+        if False (default), do not overwrite existing file (if True, the
+        file is only downloaded again if the server copy has changed)
+    session : requests.Session
+        HTTP session with which to download (default: module-level session)
 
     Returns
     -------
@@ -38,9 +82,7 @@ def download_file(fileurl, filename=None, prefix="",
     """
     if location == "data":
         # if datadir doesn't exist, create it
-        if not os.path.exists(datadir):
-            os.mkdir(datadir)
-        downloaddir = datadir
+        downloaddir = _ensure_dir(datadir)
     else:
         # location is "datasets"
         downloaddir = datasetdir
@@ -50,21 +92,95 @@ def download_file(fileurl, filename=None, prefix="",
 
     localpath = os.path.join(downloaddir, f"{prefix}{filename}")
 
-    if not overwrite:
-        if os.path.exists(localpath):
-            print(f"file {localpath} already exists")
-            return None
+    # (a zip file that is unreadable, e.g. truncated, is downloaded again
+    # rather than reused)
+    complete = os.path.exists(localpath) and (
+        not localpath.lower().endswith(".zip") or is_zipfile(localpath))
+    if os.path.exists(localpath) and not complete:
+        print(f"file {localpath} is corrupt, downloading again")
+    elif complete and not overwrite:
+        print(f"file {localpath} already exists")
+        return None
 
-    with requests.get(fileurl, stream=True) as rstream:
+    # download to a partial file first; if one is left over from an
+    # interrupted download, ask the server for just the missing bytes,
+    # provided the server copy is still the one the partial file was
+    # started from (If-Range: otherwise the server sends the whole file)
+    headers = {}
+    metapath = f"{localpath}.meta.json"
+    partpath = f"{localpath}.part"
+    partmetapath = f"{partpath}.meta.json"
+    offset = os.path.getsize(partpath) if os.path.exists(partpath) else 0
+    if offset > 0:
+        partmeta = (load_json(partmetapath)
+                    if os.path.exists(partmetapath) else {})
+        etag = partmeta.get("etag")
+        # (weak ETags cannot be used in If-Range)
+        if etag is not None and etag.startswith("W/"):
+            etag = None
+        validator = etag or partmeta.get("last_modified")
+        if validator is not None:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        else:
+            offset = 0
+    elif complete and os.path.exists(metapath):
+        # if the file was downloaded before, send the validators saved with
+        # it so the server can answer "304 Not Modified" instead of
+        # resending it
+        meta = load_json(metapath)
+        if meta.get("etag") is not None:
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified") is not None:
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    rstream = session.get(fileurl, stream=True, headers=headers,
+                          timeout=timeout)
+    if rstream.status_code == 416 and "Range" in headers:
+        # partial file is no prefix of the server copy (e.g. it is
+        # already full length): discard it and ask once for the whole file
+        # (closing the first response, so its connection is released)
+        rstream.close()
+        print(f"discarding partial download {partpath}")
+        os.remove(partpath)
+        if os.path.exists(partmetapath):
+            os.remove(partmetapath)
+        del headers["Range"], headers["If-Range"]
+        offset = 0
+        rstream = session.get(fileurl, stream=True, headers=headers,
+                              timeout=timeout)
+
+    with rstream:
         rstream.raise_for_status()
-        with open(localpath, 'wb') as fstream:
-            for chunk in rstream.iter_content(chunk_size=8192):
+        if rstream.status_code == 304:
+            print(f"file {localpath} is up to date")
+            return localpath
+        meta = {"etag": rstream.headers.get("ETag"),
+                "last_modified": rstream.headers.get("Last-Modified")}
+        if rstream.status_code != 206:
+            # range not honoured (or server copy changed): server is
+            # sending the whole file
+            offset = 0
+            # record which server copy the partial file holds, so an
+            # interrupted download can be resumed
+            write_json(meta, partmetapath)
+        with open(partpath, "r+b" if offset > 0 else "wb") as fstream:
+            fstream.seek(offset)
+            # write the stream to disk in 64 KiB chunks (small enough that
+            # an interrupted download loses little of what was received)
+            for chunk in rstream.iter_content(chunk_size=64 * 1024):
                 fstream.write(chunk)
 
+    os.replace(partpath, localpath)
+    write_json(meta, metapath)
+    if os.path.exists(partmetapath):
+        os.remove(partmetapath)
+
     return localpath
 
 
-def get_vote_data(province="ON", year=2021, overwrite=False):
+def get_vote_data(province="ON", year=2021, overwrite=False,
+                  session=session):
     """
     Download vote result data from elections.ca
 
@@ -76,28 +192,16 @@ def get_vote_data(province="ON", year=2021, overwrite=False):
         election year (one of 2008, 2011, 2015, 2019, 2021)
     overwrite : bool
         if False (default), do not overwrite existing file
+    session : requests.Session
+        HTTP session with which to download (default: module-level session)
 
     Returns
     -------
     str
         name of downloaded file
     """
-    if year == 2008:
-        base_url = ("https://www.elections.ca/"
-                    + "scripts/OVR2008/31/data/")
-    elif year == 2011:
-        base_url = ("https://www.elections.ca/"
-                    + "scripts/OVR2011/34/data_donnees/")
-    elif year == 2015:
-        base_url = ("https://www.elections.ca/"
-                    + "res/rep/off/ovr2015app/41/data_donnees/")
-    elif year == 2019:
-        base_url = ("https://www.elections.ca/"
-                    + "res/rep/off/ovr2019app/51/data_donnees/")
-    elif year == 2021:
-        base_url = ("https://www.elections.ca/"
-                    + "res/rep/off/ovr2021app/53/data_donnees/")
-    else:
+    base_url = votes_urls.get(year, None)
+    if base_url is None:
         print(f"election year {year} not implemented")
         return
 
@@ -105,10 +209,12 @@ def get_vote_data(province="ON", year=2021, overwrite=False):
 
     fileurl = urljoin(base_url, filename)
 
-    result = download_file(fileurl, prefix=f"{year}_", overwrite=overwrite)
+    result = download_file(fileurl, prefix=f"{year}_", overwrite=overwrite,
+                           session=session)
 
     # generate riding name -> number map
-    update_riding_map_file(province=province, year=year)
+    with _riding_map_lock:
+        update_riding_map_file(province=province, year=year)
 
     return result
 
@@ -128,11 +234,14 @@ def get_all_vote_data(year=2021, overwrite=False):
     str
         names of downloaded files (comma delimited)
     """
-    result_list = []
-    for province in provcodes:
-        result = get_vote_data(province, year=year, overwrite=overwrite)
-        if result is not None:
-            result_list.append(result)
+    # downloads are limited by latency, not bandwidth, so fetch the
+    # provinces concurrently over the shared session
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = executor.map(
+            lambda province: get_vote_data(province, year=year,
+                                           overwrite=overwrite),
+            provcodes)
+        result_list = [result for result in results if result is not None]
     return ",".join(result_list)
 
 
@@ -152,63 +261,26 @@ def get_geometries(year=2021, overwrite=False):
     tuple
         local filename(s) of download files
     """
-    if year == 2008:
-        base_url = ("https://ftp.geogratis.gc.ca/pub/nrcan_rncan/"
-                    + "vector/electoral/2008/")
-        filename = "pd308.2008.zip"
-        # download shape files (no separate pdf documentation)
-        shape_result = download_file(urljoin(base_url, filename),
-                                     overwrite=overwrite)
-        pdf_result = None
-    elif year == 2011:
-        base_url = ("https://ftp.geogratis.gc.ca/pub/nrcan_rncan/"
-                    + "vector/electoral/2011/")
-        filename = "pd308.2011.zip"
-        # download shape files (no separate pdf documentation)
-        shape_result = download_file(urljoin(base_url, filename),
-                                     overwrite=overwrite)
-        pdf_result = None
-    elif year == 2015:
-        base_url = ("https://ftp.maps.canada.ca/pub/elections_elections/"
-                    + "Electoral-districts_Circonscription-electorale/"
-                    + "polling_divisions_boundaries_2015/")
-        pdf_base = base_url + "doc/"
-        pdf_filename = "Data_Dictionary.pdf"
-        filename = "polling_divisions_boundaries_2015_shp.zip"
-        # download data dictionary file
-        pdf_result = download_file(urljoin(pdf_base, pdf_filename),
-                                   overwrite=overwrite)
-        # download shape files
-        shape_result = download_file(urljoin(base_url, filename),
-                                     overwrite=overwrite)
-    elif year == 2019:
-        base_url = ("https://ftp.maps.canada.ca/pub/elections_elections/"
-                    + "Electoral-districts_Circonscription-electorale/"
-                    + "Elections_Canada_2019/")
-        pdf_filename = "Elections_Canada_2019_Data_Dictionary.pdf"
-        filename = "polling_divisions_boundaries_2019.shp.zip"
-        # download data dictionary file
-        pdf_result = download_file(urljoin(base_url, pdf_filename),
-                                   overwrite=overwrite)
-        # download shape files
-        shape_result = download_file(urljoin(base_url, filename),
-                                     overwrite=overwrite)
-    elif year == 2021:
-        base_url = ("https://ftp.maps.canada.ca/pub/elections_elections/"
-                    + "Electoral-districts_Circonscription-electorale/"
-                    + "Elections_Canada_2021/")
-        pdf_filename = "Elections_Canada_2021_Data_Dictionary.pdf"
-        filename = "PD_CA_2021_EN.zip"
-        # download data dictionary file
-        pdf_result = download_file(urljoin(base_url, pdf_filename),
-                                   overwrite=overwrite)
-        # download shape files
-        shape_result = download_file(urljoin(base_url, filename),
-                                     overwrite=overwrite)
-    else:
+    filedata = geometry_files.get(year, None)
+    if filedata is None:
         print(f"year {year} not implemented")
         return None
 
+    # (2008 and 2011 have no separate pdf documentation)
+    pdf_url = filedata["pdf_url"]
+    shape_url = filedata["url"]
+
+    # download the data dictionary alongside the (much larger) shape files
+    # rather than one after the other
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        shape_future = executor.submit(download_file, shape_url,
+                                       overwrite=overwrite)
+        if pdf_url is not None:
+            pdf_result = download_file(pdf_url, overwrite=overwrite)
+        else:
+            pdf_result = None
+        shape_result = shape_future.result()
+
     return pdf_result, shape_result
 
 
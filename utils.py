@@ -8,11 +8,17 @@ Email:   mark.fruman@yahoo.com
 """
 import re
 import os
+import io
+import csv
 import json
-import pandas as pd
 from zipfile import ZipFile
+from functools import lru_cache
 from .constants import datadir, provcodes, areas, votes_encodings
 
+# compiled once rather than looked up in re's pattern cache on every call
+_INT_PART_RE = re.compile(r"\s*([a-zA-Z]*[0-9]+)")
+_POLLRESULTS_RE = re.compile(r"pollresults.*csv")
+
 
 def get_int_part(s):
     """
@@ -26,9 +32,9 @@ def get_int_part(s):
     -------
     int
     """
-    mch = re.match(r"[a-zA-Z]*[0-9]+", s.strip())
+    mch = _INT_PART_RE.match(s)
     if mch is not None:
-        return int(mch[0])
+        return int(mch[1])
     return None
 
 
@@ -117,9 +123,15 @@ def update_riding_map_file(province, year):
         for fname in zf.namelist():
             # iterate over CSV files in the zip and extract
             # riding names and numbers from first line
-            if re.match(r"pollresults.*csv", fname):
-                temp_df = pd.read_csv(zf.open(fname), encoding=csv_encoding)
-                riding_number, riding_name = temp_df.iloc[0, :2].values
+            if _POLLRESULTS_RE.match(fname):
+                # only the first data row is needed, so read just the
+                # header and that row rather than parsing the whole file
+                with io.TextIOWrapper(zf.open(fname),
+                                      encoding=csv_encoding,
+                                      newline="") as csvfile:
+                    reader = csv.reader(csvfile)
+                    next(reader)
+                    riding_number, riding_name = next(reader)[:2]
                 # for some crazy reason, in 2008, riding names end in " (?!)
                 riding_name = riding_name.strip("\"")
                 riding_map[riding_name] = int(riding_number)
@@ -128,10 +140,16 @@ def update_riding_map_file(province, year):
     write_json(riding_map, riding_map_file, ensure_ascii=False,
                indent=2, sort_keys=True)
 
+    # discard any maps loaded from the previous version of the file
+    get_riding_map.cache_clear()
+    get_inv_riding_map.cache_clear()
+
 
+@lru_cache(maxsize=8)
 def get_riding_map(year):
     """
-    Load riding map from disk
+    Load riding map from disk (cached after the first call; the returned
+    dict is shared, so do not modify it)
 
     Parameters
     ----------
@@ -145,9 +163,11 @@ def get_riding_map(year):
     return load_json(os.path.join(datadir, f"{year}_riding_map.json"))
 
 
+@lru_cache(maxsize=8)
 def get_inv_riding_map(year):
     """
-    Load inverse riding map
+    Load inverse riding map (cached after the first call; the returned
+    dict is shared, so do not modify it)
 
     Parameters
     ----------
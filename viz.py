@@ -81,10 +81,11 @@ def ridings_plot(gdf_ridings, year=2021, labels=False, title=None, **kwargs):
     inv_riding_map = get_inv_riding_map(year)
 
     if labels:
-        # add labels at centroids
-        for number, row in gdf_ridings.iterrows():
-            axobj.text(row["centroid"].x, row["centroid"].y,
-                       inv_riding_map[number], ha="center", wrap=True)
+        # add labels at centroids (taking the coordinates as whole columns
+        # rather than boxing every row in a Series)
+        centroids = gdf_ridings["centroid"]
+        for number, x, y in zip(gdf_ridings.index, centroids.x, centroids.y):
+            axobj.text(x, y, inv_riding_map[number], ha="center", wrap=True)
 
     if title is not None:
         plt.title(title)
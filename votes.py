@@ -11,40 +11,29 @@ import re
 import pandas as pd
 from zipfile import ZipFile
 from .constants import datadir, provcodes, codeprovs, votes_encodings
-from .utils import (get_int_part, area_to_ridings, apply_riding_map,
-                    validate_ridings)
+from .utils import area_to_ridings, apply_riding_map, validate_ridings
 
+# version of the cleaned vote table stored in the Parquet cache files
+# (part of the file name: increment it whenever the columns or their types
+# change, so that caches written by older code are rebuilt, not reused)
+_cache_version = 2
 
-def load_vote_data_prov(year, province, ridings=None):
+
+def _read_riding_votes(csvfile, csv_encoding):
     """
-    Load dataframe with vote results from single province
+    Read and clean the vote results of a single riding
 
     Parameters
     ----------
-    year : int
-        election year from which to load votes
-    province : str
-        two character province abbreviation
-    ridings : list
-        ridings to load
+    csvfile : file-like
+        riding CSV file (opened from the zip file)
+    csv_encoding : str
+        text encoding of the CSV file
 
     Returns
     -------
     pd.DataFrame
     """
-    provcode = provcodes[province]
-    votesfile = os.path.join(datadir,
-                             f"{year}_pollresults_resultatsbureau{provcode}"
-                             + ".zip")
-
-    df = pd.DataFrame()
-
-    if ridings is not None:
-        ridings = validate_ridings(ridings, year)
-        riding_nos = [str(rid) for rid in apply_riding_map(year, ridings)]
-    else:
-        riding_nos = []
-
     french_columns = [
         "Electoral District Name_French/Nom de circonscription_Français",
         "Political Affiliation Name_French/Appartenance politique_Français"
@@ -90,34 +79,22 @@ def load_vote_data_prov(year, province, ridings=None):
             "NoPollIndicator"
     }
 
-    # text encoding changes in 2015 (oh boy)
-    csv_encoding = votes_encodings.get(year, "utf-8")
-    # regex pattern for riding file
-    pat = re.compile(r".*pollresults.*([0-9]{5}).*")
+    # (parse the file in one pass with the C engine, inferring column types
+    # over the whole file at once, and skip the redundant French columns
+    # while parsing)
+    df = pd.read_csv(csvfile, encoding=csv_encoding, dtype=dtype_map,
+                     engine="c", low_memory=False,
+                     usecols=lambda col: col not in french_columns)
 
-    with ZipFile(votesfile, "r") as zf:
-        for fname in zf.namelist():
-            # iterate over CSV files in the zip and extract
-            # riding names and numbers from first line
-            match = pat.match(fname)
-            if match is not None:
-                # if ridings is None, get all ridings, else matchers
-                if ridings is None or match.group(1) in riding_nos:
-                    temp_df = pd.read_csv(zf.open(fname), encoding=csv_encoding,
-                                          dtype=dtype_map)
-                    df = pd.concat((df, temp_df), ignore_index=True)
-
-    # drop redundant French columns
-    df = df.drop(french_columns, axis=1)
-
-    # apply some sanity-preserving column renaming
-    df = df.rename(columns=column_renaming_map)
+    # apply some sanity-preserving column renaming (relabelling the
+    # columns in place rather than building a second renamed frame)
+    df.columns = [column_renaming_map.get(col, col) for col in df.columns]
 
     # for some reason, DistrictName ends with " in 2008
     df["DistrictName"] = df["DistrictName"].str.strip("\"")
 
     # drop rows not associated with a polling station ("Special Voting Rules")
-    df = df[~df["Poll"].str.contains("S/R")]
+    df = df[~df["Poll"].str.contains("S/R", regex=False)]
 
     # create column with the total number of votes for all parties at that poll
     df_totvotes = (df
@@ -127,13 +104,111 @@ def load_vote_data_prov(year, province, ridings=None):
                    .rename(columns={"Votes": "TotalVotes"}))
     df = df.merge(df_totvotes, on=["DistrictName", "Poll"], how="left")
 
+    # riding numbers and vote counts fit in 32-bit integers (halving the
+    # bytes moved by later groupbys and merges; sums are still int64)
+    for col in ["DistrictNumber", "Electors", "RejectedBallots",
+                "Votes", "TotalVotes"]:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype("int32")
+
     # create a column with the numeric part of the poll number for merging
-    # with the GeoDataFrames
-    df["PD_NUM"] = df["Poll"].map(get_int_part).astype("int")
+    # with the GeoDataFrames (int32, as in the geometry files)
+    df["PD_NUM"] = (df["Poll"]
+                    .str.extract(r"^\s*(\d+)", expand=False)
+                    .astype("int32"))
 
     return df
 
 
+def load_vote_data_prov(year, province, ridings=None):
+    """
+    Load dataframe with vote results from single province
+
+    The cleaned table of each riding is cached in its own Parquet file the
+    first time the riding is loaded, so later loads skip the CSV parsing
+    and cleaning (and a first load parses only the requested ridings).
+
+    Parameters
+    ----------
+    year : int
+        election year from which to load votes
+    province : str
+        two character province abbreviation
+    ridings : list
+        ridings to load
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    provcode = provcodes[province]
+    votesfile = os.path.join(datadir,
+                             f"{year}_pollresults_resultatsbureau{provcode}"
+                             + ".zip")
+    votesfile_mtime = os.path.getmtime(votesfile)
+
+    if ridings is not None:
+        ridings = validate_ridings(ridings, year)
+        riding_nos = set(apply_riding_map(year, ridings))
+
+    # text encoding changes in 2015 (oh boy)
+    csv_encoding = votes_encodings.get(year, "utf-8")
+    # regex pattern for riding file
+    pat = re.compile(r".*pollresults.*([0-9]{5}).*")
+
+    def load_riding(zf, fname, riding_no):
+        """
+        load the cleaned table of one riding, from its Parquet cache file
+        unless the zip file is newer (then parsing and caching it again)
+
+        Parameters
+        ----------
+        zf : ZipFile
+            open provincial zip file
+        fname : str
+            name of the riding CSV file in the zip file
+        riding_no : int
+            riding number
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        cachefile = os.path.join(datadir,
+                                 f"{year}_pollresults_{riding_no}"
+                                 + f".v{_cache_version}.parquet")
+        if (os.path.exists(cachefile)
+                and os.path.getmtime(cachefile) >= votesfile_mtime):
+            return pd.read_parquet(cachefile)
+
+        df_riding = _read_riding_votes(zf.open(fname), csv_encoding)
+        # write the cache (to a temporary name first, so that an
+        # interrupted write never leaves a truncated cache behind)
+        df_riding.to_parquet(f"{cachefile}.tmp", index=False)
+        os.replace(f"{cachefile}.tmp", cachefile)
+        return df_riding
+
+    # collect the tables of the ridings and concatenate them once at the
+    # end (rather than copying the growing table for every riding)
+    frames = []
+    with ZipFile(votesfile, "r") as zf:
+        # iterate over the riding CSV files in the zip
+        riding_files = []
+        for fname in zf.namelist():
+            match = pat.match(fname)
+            if match is not None:
+                riding_files.append((fname, int(match.group(1))))
+        for fname, riding_no in riding_files:
+            # if ridings is None, get all ridings, else matches
+            if ridings is None or riding_no in riding_nos:
+                frames.append(load_riding(zf, fname, riding_no))
+        # (no ridings match: return an empty table with the usual columns)
+        if len(frames) == 0:
+            frames.append(load_riding(zf, *riding_files[0]).iloc[:0])
+
+    return pd.concat(frames, ignore_index=True)
+
+
 def load_vote_data(ridings=None, area=None, year=2021):
     """
 
@@ -158,15 +233,14 @@ def load_vote_data(ridings=None, area=None, year=2021):
     riding_codes = apply_riding_map(ridings=ridings, year=year)
     codes = list(set([int(str(rid)[:2]) for rid in riding_codes]))
 
-    df = pd.DataFrame()
+    if not codes:
+        return pd.DataFrame()
 
-    for province_code in codes:
-        province = codeprovs[province_code]
-        temp_df = load_vote_data_prov(year=year, province=province,
-                                      ridings=ridings)
-        df = pd.concat((df, temp_df), ignore_index=True)
+    frames = [load_vote_data_prov(year=year, province=codeprovs[province_code],
+                                  ridings=ridings)
+              for province_code in codes]
 
-    return df
+    return pd.concat(frames, ignore_index=True)
 
 
 def compute_vote_fraction(df_vote):
@@ -212,12 +286,13 @@ def add_eday_votes(gdf_eday, gdf_advance):
     gdf_advance
         with new column for election day votes
     """
+    # (the groups are only merged back on their keys, so skip sorting them)
     gdf_eday_votes = (gdf_eday
                       .get(["DistrictName", "Party",
                             "ADV_POLL_N", "Votes", "TotalVotes"])
                       .groupby(["DistrictName", "Party",
                                 "ADV_POLL_N"],
-                               as_index=False)
+                               as_index=False, sort=False)
                       .sum()
                       .rename(columns={"ADV_POLL_N": "PD_NUM",
                                        "Votes": "ElectionDayVotes",